@@ -0,0 +1,20 @@
+"""Custom middleware for the api app"""
+from django.middleware.gzip import GZipMiddleware
+
+
+class NonStreamingGZipMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware that returns streaming responses untouched.
+
+    The stock middleware also wraps streamed bodies, compressing every
+    yielded chunk as its own gzip member; for this app's token-sized SSE
+    frames the per-member header overhead can exceed the frame itself, it
+    adds per-token CPU on the streaming hot path, and multi-member bodies
+    are fragile across proxies. Buffered responses — the large transcript
+    and analysis JSON bodies — are compressed as usual.
+    """
+
+    def process_response(self, request, response):
+        if response.streaming:
+            return response
+        return super().process_response(request, response)
@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-08-31 07:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='gymtranscript',
+            name='image_obj',
+        ),
+        migrations.AddField(
+            model_name='gymtranscript',
+            name='image_sha256',
+            field=models.CharField(blank=True, db_index=True, help_text='SHA-256 of the transcribed image content (empty for text-only)', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='gymtranscript',
+            name='image_size',
+            field=models.IntegerField(default=0, help_text='Size of the transcribed image in bytes'),
+        ),
+    ]
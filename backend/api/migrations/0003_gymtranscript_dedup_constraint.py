@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-08-31 08:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_gymtranscript_image_reference'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # The ownership fields exist on the model but were missing from the
+        # recorded migration state; they are added here so the constraint
+        # below can reference them
+        migrations.AddField(
+            model_name='gymtranscript',
+            name='user',
+            field=models.ForeignKey(blank=True, help_text='The user who created this transcript (null for anonymous)', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='gym_transcripts', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='gymtranscript',
+            name='session_key',
+            field=models.CharField(blank=True, db_index=True, help_text='Session key for anonymous users', max_length=40, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='gymtranscript',
+            constraint=models.UniqueConstraint(condition=models.Q(('image_sha256__gt', '')), fields=('user', 'session_key', 'image_sha256'), name='unique_gym_transcript_owner_image', nulls_distinct=False),
+        ),
+    ]
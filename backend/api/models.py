@@ -1,6 +1,7 @@
 from typing import Any
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils.functional import cached_property
 
 
 class AnalysisTranscript(models.Model):
@@ -54,7 +55,13 @@ class GymTranscript(models.Model):
         db_index=True,
         help_text="Session key for anonymous users"
     )
-    image_obj = models.ImageField(null=True, upload_to="Gym/%Y-%m-%d %H:%M", help_text="The image that was transcribed")
+    image_sha256 = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        help_text="SHA-256 of the transcribed image content (empty for text-only)"
+    )
+    image_size = models.IntegerField(default=0, help_text="Size of the transcribed image in bytes")
     text_obj = models.TextField(help_text="The text that was inputted")
     transcript = models.TextField(help_text="The transcribed text from the image")
     created_at = models.DateTimeField(auto_now_add=True, help_text="When the transcription was created")
@@ -66,6 +73,17 @@ class GymTranscript(models.Model):
             models.Index(fields=['user', '-created_at']),
             models.Index(fields=['session_key', '-created_at']),
         ]
+        constraints = [
+            # One row per owner per image; scoping to the owner keeps one
+            # user's resubmission from touching another user's transcript.
+            # Text-only rows (empty hash) are exempt
+            models.UniqueConstraint(
+                fields=['user', 'session_key', 'image_sha256'],
+                condition=models.Q(image_sha256__gt=''),
+                nulls_distinct=False,
+                name='unique_gym_transcript_owner_image',
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"Transcript {self.id} - created at {self.created_at.strftime('%Y-%m-%d %H:%M')}"
@@ -111,6 +129,11 @@ class Analysis(models.Model):
     def __str__(self)-> str:
         return f"Analysis {self.title or 'Untitled'} - created at {self.created_at.strftime('%Y-%m-%d %H:$M')}"
     
+    @cached_property
+    def tags_csv(self):
+        """The tags joined for prompt display, computed once per instance"""
+        return ', '.join(self.tags) if self.tags else 'N/A'
+
     def to_dict(self):
         """Converts the analysis to dictionary format"""
         return {
@@ -5,15 +5,19 @@ This package contains logic and utilities services:
 - ChatStreamGenerator: Streams conversational AI response
 - StreamGenerator: Streams Analysis and Gym response in SSE format
 - ImageTranscriber: Transcribe handwritten math solution to LaTex/Markdown
+- parse_sse_event: Parse a single SSE frame into its event payload
 """
 
-from .streaming import ChatStreamGenerator, StreamGenerator
-from .transcription import ImageTranscriber
+from .streaming import ChatStreamGenerator, StreamGenerator, aparse_sse_event, parse_sse_event
+from .transcription import ImageTranscriber, get_image_transcriber
 from .gemini_client import get_gemini_client
 
 __all__ = [
     'ChatStreamGenerator',
     'ImageTranscriber',
     'StreamGenerator',
-    'get_gemini_client'
+    'aparse_sse_event',
+    'get_gemini_client',
+    'get_image_transcriber',
+    'parse_sse_event'
 ]
\ No newline at end of file
@@ -2,21 +2,33 @@
 Shared Gemini AI client instance to avoid creating multiple clients.
 This helps with connection pooling and rate limiting.
 """
+import functools
+import httpx
 from google import genai
+from google.genai import types
 from django.conf import settings
 
-# ____EAGER INSTANTION____
-# This runs once when the server starts
-# It creates a single shared Gemini AI client instance
-FEYNMAN_GEMINI_API_KEY = settings.FEYNMAN_GEMINI_API_KEY
-
-_client_instance = genai.Client(api_key=FEYNMAN_GEMINI_API_KEY)
 
+@functools.lru_cache(maxsize=1)
 def get_gemini_client() -> genai.Client:
     """
     Returns the shared Gemini AI client instance.
-    
+
+    Built lazily on first use and memoized for the life of the process,
+    so every view shares one client and its keepalive connection pool;
+    warm requests skip the TLS handshake entirely.
+
     Returns:
         genai.Client: Shared Gemini AI client
     """
-    return _client_instance
+    return genai.Client(
+        api_key=settings.FEYNMAN_GEMINI_API_KEY,
+        http_options=types.HttpOptions(
+            async_client_args={
+                'limits': httpx.Limits(
+                    max_keepalive_connections=50,
+                    max_connections=100,
+                ),
+            },
+        ),
+    )
@@ -1,8 +1,15 @@
 from google import genai
+import asyncio
 import re
-import json
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import Any, Callable, Dict, List, Optional
+
+# Chunks above this size are parsed off the event loop; smaller ones are
+# parsed inline because the executor hop costs more than the parse itself
+_PARSE_OFFLOAD_THRESHOLD = 4096
+_PARSE_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix='sse-parse')
 
 
 def unescape_json_string(s: str) -> str:
@@ -36,13 +43,61 @@ def unescape_json_string(s: str) -> str:
     return s
 
 
+def parse_sse_event(chunk: bytes):
+    """
+    Parse a single SSE frame into its JSON event payload.
+
+    Each frame emitted by the stream generators is a self-delimited
+    `data: {...}\n\n` event, so the payload is parsed exactly once here
+    instead of ad-hoc decode/parse blocks in every view.
+
+    Args:
+        chunk: The raw SSE frame bytes
+
+    Returns:
+        The decoded event dict, or None if the frame is not a data event
+        or its payload is not valid JSON.
+    """
+    # Peek at the prefix in bytes; decoding happens only on the JSON payload
+    # as part of parsing, never as a separate pass over the whole chunk.
+    # The memoryview slice hands orjson the payload without copying it,
+    # which matters for multi-KB solution/explanation frames.
+    if not chunk.startswith(b'data: '):
+        return None
+    try:
+        return orjson.loads(memoryview(chunk)[6:])
+    except orjson.JSONDecodeError:
+        return None
+
+
+async def aparse_sse_event(chunk: bytes):
+    """
+    Async wrapper around parse_sse_event for use inside streaming views.
+
+    Large payloads (long solution/explanation events) are parsed in a worker
+    thread so the event loop stays responsive for concurrent requests, while
+    typical token-sized chunks are parsed inline.
+
+    Args:
+        chunk: The raw SSE frame bytes
+
+    Returns:
+        The decoded event dict, or None for non-data/malformed frames.
+    """
+    if len(chunk) <= _PARSE_OFFLOAD_THRESHOLD:
+        return parse_sse_event(chunk)
+    return await asyncio.get_running_loop().run_in_executor(
+        _PARSE_POOL, parse_sse_event, chunk
+    )
+
+
 class StreamGenerator:
     """
     Handles streaming of AI analysis responses in Server-Sent Events (SSE) format.
     Progressively parses and streams JSON fields as they're generated.
     """
     
-    def __init__(self, client: genai.Client, system_prompt: str, prompt_parts: list, response_schema: type[BaseModel]):
+    def __init__(self, client: genai.Client, system_prompt: str, prompt_parts: list, response_schema: type[BaseModel], on_event: Optional[Callable[[dict], None]] = None):
         """
         Initialize the stream generator.
         
@@ -51,11 +106,21 @@ class StreamGenerator:
             system_prompt: The system instruction for the AI
             prompt_parts: The prompt content to send to the AI
             response_schema: The Pydantic schema defining the expected response structure
+            on_event: Optional callback invoked with each event dict before it
+                is framed, so callers can accumulate state without re-parsing
+                the SSE bytes they stream through
         """
         self.client = client
         self.system_prompt = system_prompt
         self.prompt_parts = prompt_parts
         self.response_schema = response_schema
+        self.on_event = on_event
+
+    def _emit(self, event_data: dict) -> bytes:
+        """Hands the event to the callback and frames it as an SSE chunk"""
+        if self.on_event is not None:
+            self.on_event(event_data)
+        return b"data: " + orjson.dumps(event_data) + b"\n\n"
     
     async def generate(self):
         """
@@ -129,7 +194,7 @@ class StreamGenerator:
                                     'content': new_content,
                                     'is_complete': False
                                 }
-                                yield f"data: {json.dumps(event_data)}\n\n".encode('utf-8')
+                                yield self._emit(event_data)
                                 field_positions[field_name] = len(current_value)
                     
                     # Handle boolean fields
@@ -147,7 +212,7 @@ class StreamGenerator:
                                     'content': bool_value,
                                     'is_complete': False
                                 }
-                                yield f"data: {json.dumps(event_data)}\n\n".encode('utf-8')
+                                yield self._emit(event_data)
                                 boolean_fields_sent[field_name] = True
                     
                     # Handle array field if it exists
@@ -177,20 +242,20 @@ class StreamGenerator:
                                         'content': unescaped_items,
                                         'is_complete': False
                                     }
-                                    yield f"data: {json.dumps(event_data)}\n\n".encode('utf-8')
+                                    yield self._emit(event_data)
                                     last_array_content = array_content
             
             # Try to parse complete JSON at the end
             try:
-                complete_json = json.loads(accumulated_text)
+                complete_json = orjson.loads(accumulated_text)
                 completion_data = {
                     'type': 'complete',
                     'field': 'all',
                     'content': complete_json,
                     'is_complete': True
                 }
-                yield f"data: {json.dumps(completion_data)}\n\n".encode('utf-8')
-            except json.JSONDecodeError:
+                yield self._emit(completion_data)
+            except orjson.JSONDecodeError:
                 # Send accumulated text as fallback
                 completion_data = {
                     'type': 'complete',
@@ -198,7 +263,7 @@ class StreamGenerator:
                     'content': accumulated_text,
                     'is_complete': True
                 }
-                yield f"data: {json.dumps(completion_data)}\n\n".encode('utf-8')
+                yield self._emit(completion_data)
             
         except Exception as e:
             error_data = {
@@ -207,7 +272,7 @@ class StreamGenerator:
                 'content': str(e),
                 'is_complete': True
             }
-            yield f"data: {json.dumps(error_data)}\n\n".encode('utf-8')
+            yield self._emit(error_data)
 
 class ChatStreamGenerator:
     """
@@ -215,54 +280,67 @@ class ChatStreamGenerator:
     Uses conversation history to provide context-aware responses.
     """
     
-    def __init__(self, client: genai.Client, system_prompt: str, conversation_history: List[Dict[str, Any]], user_message: str):
+    def __init__(self, client: genai.Client, system_prompt: str, conversation_history, user_message: str):
         """
         Initialize the chat stream generator.
-        
+
         Args:
             client: The Gemini AI client instance
             system_prompt: The system instruction for the AI
-            conversation_history: List of previous messages in the conversation
+            conversation_history: Previous messages in the conversation, either
+                a list of dicts or an async iterable (e.g. a queryset
+                .values('role', 'content').aiterator()) consumed lazily
             user_message: The current user message
         """
         self.client = client
         self.system_prompt = system_prompt
         self.conversation_history = conversation_history
         self.user_message = user_message
-    
-    def _build_conversation_contents(self) -> List[Dict[str, Any]]:
+
+    @staticmethod
+    def _append_message(contents: List[Dict[str, Any]], message: Dict[str, Any]):
+        """Maps a single history message onto a Gemini content dictionary"""
+        role = message.get('role', 'user')
+        content = message.get('content', '')
+
+        if role == 'user':
+            contents.append({
+                'role': 'user',
+                'parts': [{'text': content}]
+            })
+        elif role == 'assistant' or role == 'model':
+            contents.append({
+                'role': 'model',
+                'parts': [{'text': content}]
+            })
+
+    async def _build_conversation_contents(self) -> List[Dict[str, Any]]:
         """
         Builds the conversation contents from history and current message.
-        
+        History rows are pulled lazily when an async iterable is supplied,
+        so database rows stream into the contents without an upfront list.
+
         Returns:
             List of content dictionaries formatted for the Gemini API
         """
         contents = []
-        
+
         # Add conversation history
-        for message in self.conversation_history:
-            role = message.get('role', 'user')
-            content = message.get('content', '')
-            
-            if role == 'user':
-                contents.append({
-                    'role': 'user',
-                    'parts': [{'text': content}]
-                })
-            elif role == 'assistant' or role == 'model':
-                contents.append({
-                    'role': 'model',
-                    'parts': [{'text': content}]
-                })
-        
+        if hasattr(self.conversation_history, '__aiter__'):
+            async for message in self.conversation_history:
+                self._append_message(contents, message)
+        else:
+            for message in self.conversation_history:
+                self._append_message(contents, message)
+
         # Add current user message
         contents.append({
             'role': 'user',
             'parts': [{'text': self.user_message}]
         })
-        
+
         return contents
-    
+
     async def generate(self):
         """
         Async generator that streams the AI chat response in SSE format.
@@ -272,7 +350,7 @@ class ChatStreamGenerator:
         
         try:
             # Build conversation contents
-            contents = self._build_conversation_contents()
+            contents = await self._build_conversation_contents()
             
             # Stream the response
             response = await self.client.aio.models.generate_content_stream(
@@ -293,7 +371,7 @@ class ChatStreamGenerator:
                         'content': chunk.text,
                         'is_complete': False
                     }
-                    yield f"data: {json.dumps(event_data)}\n\n".encode('utf-8')
+                    yield b"data: " + orjson.dumps(event_data) + b"\n\n"
             
             # Send completion signal
             completion_data = {
@@ -301,7 +379,7 @@ class ChatStreamGenerator:
                 'content': accumulated_text,
                 'is_complete': True
             }
-            yield f"data: {json.dumps(completion_data)}\n\n".encode('utf-8')
+            yield b"data: " + orjson.dumps(completion_data) + b"\n\n"
             
         except Exception as e:
             error_data = {
@@ -309,4 +387,4 @@ class ChatStreamGenerator:
                 'content': str(e),
                 'is_complete': True
             }
-            yield f"data: {json.dumps(error_data)}\n\n".encode('utf-8')
\ No newline at end of file
+            yield b"data: " + orjson.dumps(error_data) + b"\n\n"
\ No newline at end of file
@@ -1,9 +1,25 @@
 from google import genai
 from io import BytesIO
 from PIL import Image, ImageEnhance
+import asyncio
 import base64
+import functools
 from typing import Optional
 
+from .gemini_client import get_gemini_client
+
+# Gemini's vision pipeline tiles images at 1568px on the long side, so any
+# resolution beyond that is pure upload bandwidth with no OCR benefit
+_MAX_IMAGE_DIMENSION = 1568
+
+# Fixed instruction sent as the system prompt on every call; keeping it
+# byte-identical and ahead of the per-request image lets Gemini's implicit
+# prefix caching reuse its tokens across requests
+_TRANSCRIBE_PROMPT = (
+    'Transcribe the handwritten maths in this image to LaTex/Markdown.'
+    'Return ONLY the text, no explanations.'
+)
+
 
 class ImageTranscriber:
     """
@@ -25,7 +41,8 @@ class ImageTranscriber:
         Transcribes handwritten math with optional image preprocessing.
         
         Args:
-            image_file: The image file to transcribe
+            image_file: The image to transcribe; a file-like object or the
+                raw bytes/memoryview of an already-read upload
             text_fallback: Optional fallback text if transcription fails
             enhance: Whether to enhance contrast and sharpness
             
@@ -34,60 +51,134 @@ class ImageTranscriber:
             
         Raises:
             ValueError: If image_file is None and no text_fallback is provided
-            Exception: If transcription fails
+            genai.errors.APIError: If the Gemini call itself fails
+            httpx.HTTPError: If the transport to Gemini fails
+
+        Errors propagate with their original types so callers can map them
+        to the right HTTP status instead of seeing a generic failure.
         """
         if not image_file:
             if text_fallback:
                 return text_fallback
             raise ValueError('You must input at least an image or text')
-        
-        try:
-            # Open the image using the PIL library
-            image = Image.open(image_file)
-
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-
-            # Enhance image for better OCR
-            if enhance:
-                # Increase contrast
-                enhancer = ImageEnhance.Contrast(image)
-                image = enhancer.enhance(1.5)
-
-                # Increase sharpness
-                enhancer = ImageEnhance.Sharpness(image)
-                image = enhancer.enhance(2.0)
-
-            # Convert image to Bytes
-            buffer = BytesIO()
-            image.save(buffer, format='JPEG', quality=95)
-            image_bytes = buffer.getvalue()
-
-            # Encode to base64
-            image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-
-            # Add the images for OCR
-            prompt_parts = [
-                {
-                    'text': 'Transcribe the handwritten maths in this image to LaTex/Markdown.' 
-                    'Return ONLY the text, no explanations.'
-                },
-                {
-                    'inline_data': {
-                        'mime_type': 'image/jpeg',
-                        'data': image_base64
-                    }
+
+        # Decode/enhance/re-encode is pure CPU work; run it on a worker
+        # thread so the event loop keeps serving other requests
+        image_base64 = await asyncio.to_thread(
+            self._load_and_enhance, image_file, enhance
+        )
+
+        # Add the image for OCR; the instruction travels as the system
+        # prompt rather than an inline part
+        prompt_parts = [
+            {
+                'inline_data': {
+                    'mime_type': 'image/jpeg',
+                    'data': image_base64
                 }
-            ]
+            }
+        ]
+
+        response = await self.client.aio.models.generate_content(
+            model="gemini-2.5-flash",
+            config={'system_instruction': _TRANSCRIBE_PROMPT},
+            contents={'parts': prompt_parts}
+        )
+
+        # Return transcribed text or fallback to text_fallback
+        return response.text if response.text else (text_fallback or "")
+
+    async def transcribe_stream(self, image_file, enhance: bool = True):
+        """
+        Async generator variant of transcribe that yields partial text
+        chunks as Gemini produces them, for streaming responses.
+
+        Args:
+            image_file: The image to transcribe; a file-like object or the
+                raw bytes/memoryview of an already-read upload
+            enhance: Whether to enhance contrast and sharpness
+
+        Yields:
+            Partial transcription text fragments, in order
+        """
+        image_base64 = await asyncio.to_thread(
+            self._load_and_enhance, image_file, enhance
+        )
+
+        prompt_parts = [
+            {
+                'inline_data': {
+                    'mime_type': 'image/jpeg',
+                    'data': image_base64
+                }
+            }
+        ]
+
+        response = await self.client.aio.models.generate_content_stream(
+            model="gemini-2.5-flash",
+            config={'system_instruction': _TRANSCRIBE_PROMPT},
+            contents={'parts': prompt_parts}
+        )
 
-            response = await self.client.aio.models.generate_content(
-                model="gemini-2.5-flash",
-                contents={'parts': prompt_parts}
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    @staticmethod
+    def _load_and_enhance(image_file, enhance: bool) -> str:
+        """
+        Synchronous PIL phase: load, optionally enhance and re-encode the
+        image, returning it base64-encoded for the Gemini payload.
+        Runs on a worker thread via asyncio.to_thread.
+        """
+        # Accept raw upload bytes without an extra copy; PIL needs a
+        # file-like object, and BytesIO wraps the buffer as-is
+        if isinstance(image_file, (bytes, bytearray, memoryview)):
+            image_file = BytesIO(image_file)
+
+        # Open the image using the PIL library
+        image = Image.open(image_file)
+
+        # Convert to RGB if necessary
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        # Enhance image for better OCR
+        if enhance:
+            # Increase contrast
+            enhancer = ImageEnhance.Contrast(image)
+            image = enhancer.enhance(1.5)
+
+            # Increase sharpness
+            enhancer = ImageEnhance.Sharpness(image)
+            image = enhancer.enhance(2.0)
+
+        # Downscale phone-camera resolutions to the tile boundary; uploads
+        # shrink several-fold while the transcription quality is unchanged
+        if max(image.size) > _MAX_IMAGE_DIMENSION:
+            image.thumbnail(
+                (_MAX_IMAGE_DIMENSION, _MAX_IMAGE_DIMENSION),
+                Image.Resampling.LANCZOS
             )
-            
-            # Return transcribed text or fallback to text_fallback
-            return response.text if response.text else (text_fallback or "")
-        
-        except Exception as e:
-            raise Exception(f'Error {str(e)} occurred during transcription')
\ No newline at end of file
+
+        # Convert image to Bytes
+        buffer = BytesIO()
+        image.save(buffer, format='JPEG', quality=85, optimize=True, progressive=True)
+        image_bytes = buffer.getvalue()
+
+        # Encode to base64
+        return base64.b64encode(image_bytes).decode('utf-8')
+
+
+@functools.lru_cache(maxsize=1)
+def get_image_transcriber() -> ImageTranscriber:
+    """
+    Returns the shared ImageTranscriber instance.
+
+    The transcriber holds no per-request state, only the shared client,
+    so one instance serves every upload.
+
+    Returns:
+        ImageTranscriber: Shared transcriber bound to the shared client
+    """
+    return ImageTranscriber(client=get_gemini_client())
@@ -404,7 +404,7 @@ async def test_chat_stream_generator_build_contents():
     )
     
     try:
-        contents = generator._build_conversation_contents()
+        contents = await generator._build_conversation_contents()
         
         print(f"\nBuilt contents with {len(contents)} items")
         
@@ -0,0 +1,18 @@
+"""Upload handlers tuned for large image uploads"""
+from django.core.files.uploadhandler import (
+    MemoryFileUploadHandler,
+    TemporaryFileUploadHandler,
+)
+
+# Django's default 64KiB chunk size means a multi-MB handwriting photo is
+# shuttled through dozens of receive/copy cycles; 1MiB moves the same bytes
+# in a handful of larger reads
+_CHUNK_SIZE = 1024 * 1024
+
+
+class LargeChunkMemoryFileUploadHandler(MemoryFileUploadHandler):
+    chunk_size = _CHUNK_SIZE
+
+
+class LargeChunkTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    chunk_size = _CHUNK_SIZE
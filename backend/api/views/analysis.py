@@ -2,14 +2,17 @@ from adrf.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
 from django.http import StreamingHttpResponse
-from django.conf import settings
-import json
+from django.db import connection
+from asgiref.sync import sync_to_async
+import orjson
 from ..services import StreamGenerator, get_gemini_client
 from ..models import Analysis, GymQuestions, GymSesh
 from ..schemas import AnalysisResponseSchema
 from .auth import get_user_session_info, filter_by_owner
 
-FEYNMAN_GEMINI_API_KEY = settings.FEYNMAN_GEMINI_API_KEY
+# Status value hoisted out of the enum class so the request hot path skips
+# the choices-metaclass attribute lookup
+_SESH_PENDING = GymSesh.Status.PENDING
 
 
 class AnalyzeSolutionView(APIView):
@@ -85,39 +88,42 @@ class AnalyzeSolutionView(APIView):
                 'practice_problem': ''
             }
 
+            def accumulate(event_data):
+                """
+                Folds one streamed event into the accumulated result.
+                Partial text deltas are ignored: concatenating them grows
+                quadratically with output length, and the final complete
+                event always carries every field in full.
+                """
+                if event_data['type'] == 'array':
+                    field = event_data['field']
+                    accumulated_result[field] = event_data['content']
+                elif event_data['type'] == 'boolean':
+                    field = event_data['field']
+                    accumulated_result[field] = event_data['content']
+                elif event_data['type'] == 'complete':
+                    if isinstance(event_data['content'], dict):
+                        accumulated_result.update(event_data['content'])
+
+            # The generator hands each event dict to the callback as it
+            # frames it, so the loop below is a pure bytes pass-through with
+            # no second decode of the frames it yields
             stream_generator = StreamGenerator(
                 client=client,
                 system_prompt=system_prompt,
                 prompt_parts=prompt_parts,
-                response_schema=AnalysisResponseSchema
+                response_schema=AnalysisResponseSchema,
+                on_event=accumulate
             )
 
-            # Stream and accumulate the result
+            # Release the Postgres connection for the duration of the stream;
+            # generation runs for seconds and needs no database, and the
+            # save queries below reconnect transparently
+            await sync_to_async(connection.close)()
+
             async for chunk in stream_generator.generate():
                 yield chunk
 
-                try:
-                    chunk_str = chunk.decode('utf-8')
-                    if chunk_str.startswith('data: '):
-                        json_str = chunk_str[6:].strip()
-                        event_data = json.loads(json_str)
-
-                        if event_data['type'] == 'partial':
-                            field = event_data['field']
-                            content = event_data['content']
-                            accumulated_result[field] += content
-                        elif event_data['type'] == 'array':
-                            field = event_data['field']
-                            accumulated_result[field] = event_data['content']
-                        elif event_data['type'] == 'boolean':
-                            field = event_data['field']
-                            accumulated_result[field] = event_data['content']
-                        elif event_data['type'] == 'complete':
-                            if isinstance(event_data['content'], dict):
-                                accumulated_result.update(event_data['content'])
-                except:
-                    pass
-
             # Save to the database after streaming is complete
             try:
                 analysis.title = accumulated_result.get('title', '')
@@ -131,7 +137,7 @@ class AnalyzeSolutionView(APIView):
                     user=owner_info['user'],
                     session_key=owner_info['session_key'],
                     analysis=analysis,
-                    status=GymSesh.Status.PENDING
+                    status=_SESH_PENDING
                 )
 
                 gym_question = await GymQuestions.objects.acreate(
@@ -153,14 +159,14 @@ class AnalyzeSolutionView(APIView):
                     'question_number': 1,
                     'is_complete': True
                 }
-                yield f"data: {json.dumps(final_event)}\n\n".encode('utf-8')
+                yield b"data: " + orjson.dumps(final_event) + b"\n\n"
             except Exception as e:
                 final_event = {
                     'type': 'save_error',
                     'content': f'Failed to save analysis, {str(e)} occured',
                     'is_complete': True
                 }
-                yield f"data: {json.dumps(final_event)}\n\n".encode('utf-8')
+                yield b"data: " + orjson.dumps(final_event) + b"\n\n"
 
         response = StreamingHttpResponse(
             stream_with_db_save(),
@@ -11,10 +11,16 @@ from django.utils.decorators import method_decorator
 def get_user_session_info(request):
     """
     Helper function to get user and session info from request.
+    The result is memoized on the request, so repeated calls during a
+    single request skip the session-store access.
     Returns a dict with user (or None) and session_key.
     """
+    owner_info = getattr(request, '_owner_info', None)
+    if owner_info is not None:
+        return owner_info
+
     if request.user.is_authenticated:
-        return {
+        owner_info = {
             'user': request.user,
             'session_key': None
         }
@@ -22,23 +28,26 @@ def get_user_session_info(request):
         # Ensure session exists for anonymous users
         if not request.session.session_key:
             request.session.create()
-        return {
+        owner_info = {
             'user': None,
             'session_key': request.session.session_key
         }
 
+    request._owner_info = owner_info
+    return owner_info
+
 
-def filter_by_owner(queryset, request):
+def filter_by_owner(queryset, owner_info):
     """
     Filter a queryset to only include items owned by the current user/session.
+    Takes the owner-info dict from get_user_session_info, so callers that
+    already resolved the owner don't touch the request again.
     """
-    if request.user.is_authenticated:
-        return queryset.filter(user=request.user)
-    else:
-        session_key = request.session.session_key
-        if session_key:
-            return queryset.filter(session_key=session_key)
-        return queryset.none()
+    if owner_info['user'] is not None:
+        return queryset.filter(user=owner_info['user'])
+    if owner_info['session_key']:
+        return queryset.filter(session_key=owner_info['session_key'])
+    return queryset.none()
 
 
 @method_decorator(ensure_csrf_cookie, name='dispatch')
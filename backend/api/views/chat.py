@@ -1,15 +1,27 @@
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from adrf.views import APIView
 from rest_framework.response import Response
-from django.conf import settings
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connection
 from django.http import StreamingHttpResponse
-from google import genai
-import json
 from ..models import Chat, Analysis
-from ..services import ChatStreamGenerator, get_gemini_client
+from ..services import ChatStreamGenerator, get_gemini_client, aparse_sse_event
 from .auth import get_user_session_info, filter_by_owner
 
-FEYNMAN_GEMINI_API_KEY = settings.FEYNMAN_GEMINI_API_KEY
+# Role values hoisted out of the enum class so the request hot path skips
+# the choices-metaclass attribute lookups
+_ROLE_USER = Chat.Role.USER
+_ROLE_MODEL = Chat.Role.MODEL
+
+# Analysis evaluation fields are filled in once by the post-stream finalize
+# and never change afterwards, so a fully evaluated context can sit in the
+# cache for a while without invalidation concerns
+_ANALYSIS_CACHE_TTL = 3600
+
+# Only the most recent messages are sent to Gemini; older turns add input
+# tokens and latency linearly while contributing little to the next reply
+_HISTORY_WINDOW_MESSAGES = 20
 
 class ChatView(APIView):
     """
@@ -53,27 +65,58 @@ class ChatView(APIView):
         
         request.session['analysis_id'] = analysis_id
         
-        # Fetch the analysis for context (and verify ownership)
-        try:
-            analysis = await Analysis.objects.aget(id=analysis_id)
-            # Verify ownership
-            if owner_info['user']:
-                if analysis.user != owner_info['user']:
-                    return Response({'error': 'Access denied'}, status=403)
-            elif owner_info['session_key']:
-                if analysis.session_key != owner_info['session_key']:
-                    return Response({'error': 'Access denied'}, status=403)
-        except Analysis.DoesNotExist:
-            return Response({'error': 'Analysis not found'}, status=404)
+        # Fetch the analysis for context, with ownership enforced in the query
+        # itself so denied access and not-found both fall out as a 404. The
+        # evaluated context never changes once written, so it is cached per
+        # owner and repeat chat turns skip the database entirely.
+        owner_key = (
+            f"user:{owner_info['user'].id}" if owner_info['user']
+            else f"session:{owner_info['session_key']}"
+        )
+        cache_key = f"analysis:{analysis_id}:{owner_key}"
+        analysis_ctx = await cache.aget(cache_key)
+        if analysis_ctx is None:
+            owner_filter = (
+                {'user': owner_info['user']} if owner_info['user']
+                else {'session_key': owner_info['session_key']}
+            )
+            try:
+                analysis = await Analysis.objects.only(
+                    'id', 'user_id', 'session_key', 'problem', 'attempt',
+                    'title', 'tags', 'praise', 'diagnosis', 'explanation'
+                ).aget(id=analysis_id, **owner_filter)
+            except Analysis.DoesNotExist:
+                return Response({'error': 'Analysis not found'}, status=404)
+
+            # Cache only the fields the prompt needs, not the ORM instance
+            analysis_ctx = {
+                'problem': analysis.problem,
+                'attempt': analysis.attempt,
+                'title': analysis.title,
+                'tags_csv': analysis.tags_csv,
+                'praise': analysis.praise,
+                'diagnosis': analysis.diagnosis,
+                'explanation': analysis.explanation,
+            }
+            # The evaluation fields land only after the analysis stream
+            # finishes; an empty explanation means that save hasn't happened
+            # yet, and caching it would pin the empty context for the TTL
+            if analysis_ctx['explanation']:
+                await cache.aset(cache_key, analysis_ctx, _ANALYSIS_CACHE_TTL)
         
-        # Load conversation history from database
-        chat_messages = Chat.objects.filter(analysis_id=analysis_id).order_by('created_at')
-        conversation_history = []
-        async for msg in chat_messages:
-            conversation_history.append({
-                'role': msg.role,
-                'content': msg.content
-            })
+        # Pull only the most recent window of history in one cursor pass; the
+        # newest rows are selected in SQL and then restored to oldest-first.
+        # The id tiebreaker keeps bulk-inserted pairs, whose timestamps can
+        # tie, in user-then-model order
+        history_rows = await sync_to_async(list)(
+            Chat.objects.filter(analysis_id=analysis_id)
+            .order_by('-created_at', '-id')
+            .values_list('role', 'content')[:_HISTORY_WINDOW_MESSAGES]
+        )
+        history_rows.reverse()
+        conversation_history = [
+            {'role': role, 'content': content} for role, content in history_rows
+        ]
         
         # Build system prompt with analysis context
         system_prompt = f"""
@@ -100,26 +143,26 @@ class ChatView(APIView):
         
         <previous_analysis>
         You previously analyzed this student's work with the following context:
-        Problem: {analysis.problem}
-        Student Attempt: {analysis.attempt}
-        
+        Problem: {analysis_ctx['problem']}
+        Student Attempt: {analysis_ctx['attempt']}
+
         Your previous analysis:
-        Title: {analysis.title}
-        Tags: {', '.join(analysis.tags) if analysis.tags else 'N/A'}
-        Praise: {analysis.praise}
-        Diagnosis: {analysis.diagnosis}
-        Explanation: {analysis.explanation}
+        Title: {analysis_ctx['title']}
+        Tags: {analysis_ctx['tags_csv']}
+        Praise: {analysis_ctx['praise']}
+        Diagnosis: {analysis_ctx['diagnosis']}
+        Explanation: {analysis_ctx['explanation']}
         
         Use this context to provide more relevant and personalized guidance.
         </previous_analysis>
         """
         
-        # Save the user message to the database first
-        await Chat.objects.acreate(
+        # Queue the user message; it is inserted together with the model reply
+        user_chat = Chat(
             user=owner_info['user'],
             session_key=owner_info['session_key'],
-            analysis=analysis,
-            role=Chat.Role.USER,
+            analysis_id=analysis_id,
+            role=_ROLE_USER,
             content=user_message
         )
         
@@ -135,29 +178,31 @@ class ChatView(APIView):
                 user_message=user_message
             )
 
+            # Release the Postgres connection for the duration of the stream;
+            # generation runs for seconds and needs no database, and the
+            # bulk insert below reconnects transparently
+            await sync_to_async(connection.close)()
+
             async for chunk in chat_generator.generate():
                 yield chunk
                 
                 # Parse chunk to accumulate the response
-                try:
-                    chunk_str = chunk.decode('utf-8')
-                    if chunk_str.startswith('data: '):
-                        json_str = chunk_str[6:].strip()
-                        event_data = json.loads(json_str)
-                        
-                        if event_data['type'] == 'text':
-                            accumulated_response += event_data['content']
-                        elif event_data['type'] == 'complete':
-                            # Save the complete AI response to the database
-                            await Chat.objects.acreate(
-                                user=owner_info['user'],
-                                session_key=owner_info['session_key'],
-                                analysis=analysis,
-                                role=Chat.Role.MODEL,
-                                content=accumulated_response
-                            )
-                except Exception:
-                    pass
+                event_data = await aparse_sse_event(chunk)
+                if event_data is None:
+                    continue
+
+                if event_data['type'] == 'text':
+                    accumulated_response += event_data['content']
+                elif event_data['type'] == 'complete':
+                    # Save both sides of the exchange with a single bulk insert
+                    model_chat = Chat(
+                        user=owner_info['user'],
+                        session_key=owner_info['session_key'],
+                        analysis_id=analysis_id,
+                        role=_ROLE_MODEL,
+                        content=accumulated_response
+                    )
+                    await Chat.objects.abulk_create([user_chat, model_chat])
         
         # Return streaming response
         response = StreamingHttpResponse(
@@ -187,20 +232,19 @@ class ChatView(APIView):
         if not analysis_id:
             return Response({'error': 'analysis_id is required'}, status=400)
         
-        # Verify analysis ownership
+        # Verify analysis ownership without pulling the full row
+        owner_filter = (
+            {'user': owner_info['user']} if owner_info['user']
+            else {'session_key': owner_info['session_key']}
+        )
         try:
-            analysis = await Analysis.objects.aget(id=analysis_id)
-            if owner_info['user']:
-                if analysis.user != owner_info['user']:
-                    return Response({'error': 'Access denied'}, status=403)
-            elif owner_info['session_key']:
-                if analysis.session_key != owner_info['session_key']:
-                    return Response({'error': 'Access denied'}, status=403)
+            await Analysis.objects.only('id').aget(id=analysis_id, **owner_filter)
         except Analysis.DoesNotExist:
             return Response({'error': 'Analysis not found'}, status=404)
         
-        # Fetch all chat messages for this analysis
-        chat_messages = Chat.objects.filter(analysis_id=analysis_id).order_by('created_at')
+        # Fetch all chat messages for this analysis; the id tiebreaker keeps
+        # bulk-inserted pairs, whose timestamps can tie, in insertion order
+        chat_messages = Chat.objects.filter(analysis_id=analysis_id).order_by('created_at', 'id')
         messages = []
         async for msg in chat_messages:
             messages.append({
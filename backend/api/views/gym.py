@@ -1,16 +1,65 @@
 from rest_framework.parsers import MultiPartParser, FormParser
 from adrf.views import APIView
 from rest_framework.response import Response
-from django.conf import settings
+from asgiref.sync import sync_to_async
+from django.db import connection, transaction
+from django.db.models import F
 from django.utils import timezone
 from django.http import StreamingHttpResponse
-import json
+from dataclasses import dataclass
+import asyncio
+import orjson
 from ..schemas import GymResponseSchema
 from ..services import StreamGenerator, get_gemini_client
 from ..models import GymQuestions, GymSesh
 from .auth import get_user_session_info, filter_by_owner
 
-FEYNMAN_GEMINI_API_KEY = settings.FEYNMAN_GEMINI_API_KEY
+# Status values hoisted out of the enum classes so the request hot path
+# skips the choices-metaclass attribute lookups
+_SESH_PENDING = GymSesh.Status.PENDING
+_SESH_ACTIVE = GymSesh.Status.ACTIVE
+_SESH_COMPLETED = GymSesh.Status.COMPLETED
+_QUESTION_EVALUATING = GymQuestions.Status.EVALUATING
+_QUESTION_EVALUATED = GymQuestions.Status.EVALUATED
+
+# SSE frame for the end-of-stream save confirmation; only the ids vary per
+# request, so the JSON skeleton is serialized once at import time
+_FINAL_EVENT_TEMPLATE = (
+    b'data: {"type": "gym_evaluation_saved", "gym_sesh_id": "%s", '
+    b'"next_question_id": %d, "question_number": %d, "is_complete": true}\n\n'
+)
+
+
+@dataclass(slots=True)
+class GymAccumulator:
+    """
+    Accumulates the streamed gym evaluation events the finalize step needs.
+    Partial text deltas are not tracked; feedback and solution are taken from
+    the final complete payload, which always carries the full field values.
+    """
+    is_correct: bool | None = None
+    complete: dict | None = None
+
+    def apply(self, event_data: dict):
+        """Folds a single parsed SSE event into the accumulator"""
+        if event_data['type'] == 'boolean':
+            if event_data['field'] == 'is_correct':
+                self.is_correct = event_data['content']
+        elif event_data['type'] == 'complete':
+            if isinstance(event_data['content'], dict):
+                self.complete = event_data['content']
+
+    def result(self) -> dict:
+        """Returns the evaluation fields, preferring the final complete event"""
+        final = {
+            'is_correct': self.is_correct,
+            'feedback': '',
+            'solution': '',
+            'next_question': '',
+        }
+        if self.complete is not None:
+            final.update(self.complete)
+        return final
 
 
 class GymSolutionView(APIView):
@@ -29,10 +78,13 @@ class GymSolutionView(APIView):
         """
         
         # Step 1: Validation & Retrieval
-        data = request.POST.dict()
-        gym_sesh_id = data.get('gym_sesh_id', '')
-        gym_question_id = data.get('gym_question_id', '')
-        question_number = int(data.get('question_number', 1))
+        # Read the handful of fields directly off the QueryDict instead of
+        # copying every multipart field (attempt/problem can be large)
+        gym_sesh_id = request.POST.get('gym_sesh_id', '')
+        gym_question_id = request.POST.get('gym_question_id', '')
+        question_number = int(request.POST.get('question_number', 1))
+        problem = request.POST.get('problem', '')
+        attempt = request.POST.get('attempt', '')
 
         if not gym_sesh_id:
             return Response({'error': 'Gym session not found'}, status=404)
@@ -40,130 +92,139 @@ class GymSolutionView(APIView):
             return Response({'error': 'Gym question not found'}, status=404)
         
         try:
-            # Create queryset to filter the database by ownership
+            # Create queryset to filter the database by ownership; the filter
+            # already guarantees ownership, so only the fields this handler
+            # touches are pulled from the row
             query_set = GymSesh.objects.filter(id=gym_sesh_id)
             query_set = filter_by_owner(query_set, owner_info)
-            gym_sesh = await query_set.aget()
-            
-            # Update the gym session status if not already active
-            if gym_sesh.status == GymSesh.Status.PENDING:
-                gym_sesh.started_at = timezone.now()
-                gym_sesh.status = GymSesh.Status.ACTIVE
-                await gym_sesh.asave()
-            
-            # Get the question
-            gym_question = await GymQuestions.objects.aget(gym_sesh=gym_sesh, question_number=question_number)
-
-            # Check if the question has been answered  
-            if gym_question.is_answered:
+            # Fetch the session and the question concurrently; the question
+            # is keyed by the session id, so its ownership check is settled
+            # by whether the session fetch itself succeeds
+            gym_sesh, gym_question = await asyncio.gather(
+                query_set.only(
+                    'id', 'status', 'started_at', 'num_questions', 'score'
+                ).aget(),
+                GymQuestions.objects.aget(
+                    gym_sesh_id=gym_sesh_id, question_number=question_number
+                )
+            )
+
+            # Activate a pending session with one targeted UPDATE; filtering
+            # on the status makes the started_at transition write-once even
+            # under concurrent submissions
+            if gym_sesh.status == _SESH_PENDING:
+                await GymSesh.objects.filter(
+                    pk=gym_sesh.pk, status=_SESH_PENDING
+                ).aupdate(status=_SESH_ACTIVE, started_at=timezone.now())
+
+            # Claim the question with a single conditional UPDATE; a zero
+            # rowcount means another submission already answered it
+            claimed = await GymQuestions.objects.filter(
+                pk=gym_question.pk, is_answered=False
+            ).aupdate(
+                status=_QUESTION_EVALUATING,
+                attempt=attempt,
+                answered_at=timezone.now(),
+                is_answered=True
+            )
+            if not claimed:
                 return Response({'error': 'Question has been answered'}, status=400)
 
-            # Update the records
-            gym_question.status = GymQuestions.Status.EVALUATING
-            gym_question.attempt = data['attempt']
-            gym_question.answered_at = timezone.now()
-            gym_question.is_answered = True
-            await gym_question.asave()
+            # Seed the next question row up front so the post-stream finalize
+            # only has to fill in its text rather than pay for an INSERT on
+            # the critical path; get_or_create keeps retried submissions from
+            # stacking up duplicate placeholders
+            next_question, _ = await GymQuestions.objects.aget_or_create(
+                gym_sesh_id=gym_sesh.pk,
+                question_number=question_number + 1,
+                defaults={'question': ''}
+            )
 
         except GymQuestions.DoesNotExist:
             return Response({'error': 'Question does not exist'}, status=404)
         except GymSesh.DoesNotExist:
             return Response({'error': 'Gym Session does not exist'}, status=404)
         
-        prompt_parts = []
-
-        prompt_parts.append({'text': 'Solve the following math problem: '})
-
-        if data.get('problem'):
-            prompt_parts.append({'text': data['problem']})
-        else:
+        if not problem:
             return Response({'error': 'No problem context'}, status=400)
-        
-        prompt_parts.append({'text': 'Here is the student attempt: '})
-
-        if data.get('attempt'):
-            prompt_parts.append({'text': data['attempt']})
-        else:
+        if not attempt:
             return Response({'error': 'Input attempt context'}, status=400)
 
+        # One combined part instead of four; each part becomes a separate
+        # content entry on the wire, so this shrinks the request payload and
+        # the per-part allocations
+        prompt_parts = [{
+            'text': f'Solve the following math problem: {problem}\n\n'
+                    f'Here is the student attempt: {attempt}'
+        }]
+
         # Async generator for streaming and saving to the database
         async def stream_with_db_save():
             """Stream the response to the user then save the accumulated result to the database"""
-            accumulated_result = {
-                'is_correct': None,
-                'feedback': '',
-                'solution': '',
-                'next_question': ''
-            }
+            accumulator = GymAccumulator()
 
+            # The generator hands each event dict to the accumulator as it
+            # frames it, so the loop below is a pure bytes pass-through with
+            # no second decode of the frames it yields
             stream_generator = StreamGenerator(
                 client=client,
                 system_prompt=system_prompt,
                 prompt_parts=prompt_parts,
-                response_schema=GymResponseSchema
+                response_schema=GymResponseSchema,
+                on_event=accumulator.apply
             )
 
-            # Stream and accumulate the result
+            # Release the Postgres connection for the duration of the stream;
+            # generation runs for seconds and needs no database, and the
+            # finalize queries below reconnect transparently
+            await sync_to_async(connection.close)()
+
             async for chunk in stream_generator.generate():
                 yield chunk
 
-                try:
-                    chunk_str = chunk.decode('utf-8')
-                    if chunk_str.startswith('data: '):
-                        json_str = chunk_str[6:].strip()
-                        event_data = json.loads(json_str)
-
-                        # Accumulate based on event type
-                        if event_data['type'] == 'partial':
-                            field = event_data['field']
-                            content = event_data['content']
-                            accumulated_result[field] += content
-                        elif event_data['type'] == 'boolean':
-                            field = event_data['field']
-                            accumulated_result[field] = event_data['content']
-                        elif event_data['type'] == 'complete':
-                            if isinstance(event_data['content'], dict):
-                                accumulated_result.update(event_data['content'])
-                except:
-                    pass
+            accumulated_result = accumulator.result()
 
             # Save to the database AFTER streaming is complete
+            def finalize_evaluation():
+                """Commit the session, question and next-question writes as one transaction"""
+                with transaction.atomic():
+                    # Increment the counters in the database so concurrent
+                    # submissions cannot lose updates to each other
+                    GymSesh.objects.filter(pk=gym_sesh.pk).update(
+                        num_questions=F('num_questions') + 1,
+                        score=F('score') + int(bool(accumulated_result['is_correct']))
+                    )
+
+                    GymQuestions.objects.filter(pk=gym_question.pk).update(
+                        status=_QUESTION_EVALUATED,
+                        is_correct=accumulated_result.get('is_correct') or False,
+                        feedback=accumulated_result.get('feedback', ''),
+                        solution=accumulated_result.get('solution', '')
+                    )
+
+                    GymQuestions.objects.filter(pk=next_question.pk).update(
+                        question=accumulated_result.get('next_question', '')
+                    )
+
             try:
-                gym_sesh.num_questions += 1
-                if accumulated_result['is_correct']:
-                    gym_sesh.score += 1
-                await gym_sesh.asave()
-
-                gym_question.status = GymQuestions.Status.EVALUATED
-                gym_question.is_correct = accumulated_result.get('is_correct', False)
-                gym_question.feedback = accumulated_result.get('feedback', '')
-                gym_question.solution = accumulated_result.get('solution', '')
-                await gym_question.asave()
-
-                next_question = await GymQuestions.objects.acreate(
-                    gym_sesh=gym_sesh,
-                    question=accumulated_result.get('next_question', ''),
-                    question_number=question_number + 1
-                )
+                await sync_to_async(finalize_evaluation)()
 
                 request.session['next_question_id'] = next_question.id
 
-                # Send the final event with the necessary ids
-                final_event = {
-                    'type': 'gym_evaluation_saved',
-                    'gym_sesh_id': str(gym_sesh_id),
-                    'next_question_id': next_question.id,
-                    'question_number': question_number + 1,
-                    'is_complete': True
-                }
-                yield f"data: {json.dumps(final_event)}\n\n".encode('utf-8')
+                # Send the final event with the necessary ids; the session id
+                # comes from the validated row rather than the raw POST value
+                yield _FINAL_EVENT_TEMPLATE % (
+                    str(gym_sesh.pk).encode('utf-8'),
+                    next_question.id,
+                    question_number + 1
+                )
             except Exception as e:
                 final_event = {
                     'type': 'save_error',
                     'content': f'Failed to save gym evaluation, {str(e)} occurred',
                     'is_complete': True
                 }
-                yield f"data: {json.dumps(final_event)}\n\n".encode('utf-8')
+                yield b"data: " + orjson.dumps(final_event) + b"\n\n"
 
         response = StreamingHttpResponse(
             stream_with_db_save(),
@@ -207,7 +268,10 @@ class GymSolutionView(APIView):
             queryset = queryset.filter(gym_sesh__session_key=owner_info['session_key'])
 
         try:
-            gym_question = await queryset.select_related('gym_sesh').aget()
+            # No select_related: to_dict only reads the question's own
+            # columns, and the ownership filters above join through
+            # gym_sesh in SQL without needing the related row materialized
+            gym_question = await queryset.aget()
             return Response(gym_question.to_dict(), status=200)
         
         except GymQuestions.DoesNotExist:
@@ -227,21 +291,27 @@ class GymCompleteView(APIView):
 
         owner_info = get_user_session_info(request)
 
-        try:
-            query_set = GymSesh.objects.filter(id=gym_sesh_id)
-            query_set = filter_by_owner(query_set, owner_info)
-            gym_sesh = await query_set.aget()
+        query_set = GymSesh.objects.filter(id=gym_sesh_id)
+        query_set = filter_by_owner(query_set, owner_info)
 
-            gym_sesh.status = GymSesh.Status.COMPLETED
-            gym_sesh.completed_at = timezone.now()
-            await gym_sesh.asave()
+        # Complete the session with one targeted UPDATE; a zero rowcount
+        # covers both a missing session and an ownership mismatch
+        updated = await query_set.aupdate(
+            status=_SESH_COMPLETED,
+            completed_at=timezone.now()
+        )
+        if not updated:
+            return Response({'error': 'Gym session not found or access denied'}, status=404)
 
-            return Response({
-                'status': 'completed',
-                'score': gym_sesh.score,
-                'num_questions': gym_sesh.num_questions,
-                'percentage': gym_sesh.to_percentage,
-            }, status=200)
+        totals = await GymSesh.objects.values('score', 'num_questions').aget(id=gym_sesh_id)
+        num_questions = totals['num_questions']
+        percentage = (
+            round((totals['score'] / num_questions) * 100, 1) if num_questions else 0
+        )
 
-        except GymSesh.DoesNotExist:
-            return Response({'error': 'Gym session not found or access denied'}, status=404)
\ No newline at end of file
+        return Response({
+            'status': 'completed',
+            'score': totals['score'],
+            'num_questions': num_questions,
+            'percentage': percentage,
+        }, status=200)
\ No newline at end of file
@@ -2,12 +2,13 @@ from rest_framework.response import Response
 from adrf.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.conf import settings
-from ..services import ImageTranscriber, get_gemini_client
+import asyncio
+import httpx
+from google.genai import errors as genai_errors
+from ..services import get_image_transcriber
 from ..models import AnalysisTranscript
 from .auth import get_user_session_info
-
-FEYNMAN_GEMINI_API_KEY = settings.FEYNMAN_GEMINI_API_KEY
-
+from .uploads import is_supported_image, schedule_image_attach
 
 class TranscribeAnalysisImageView(APIView):
     parser_classes = (MultiPartParser, FormParser)
@@ -23,39 +24,60 @@ class TranscribeAnalysisImageView(APIView):
         Returns:
             Transcribed text in LaTeX/Markdown format, or error Response
         """
-        # Get shared client instance
-        client = get_gemini_client()
-
-        # Retrieve the data from the request
+        # Retrieve the data from the request; the upload is read exactly
+        # once and the same buffer feeds both transcription and storage
         image_file = request.FILES.get('data_image')
+        image_bytes = image_file.read() if image_file is not None else None
         text_fallback = request.POST.get('data_text', '')
         is_question = 'is_question' in request.POST
 
+        # Reject oversized or non-image payloads from the header alone,
+        # before any PIL or Gemini resources are committed to them
+        if image_bytes:
+            if len(image_bytes) > settings.MAX_IMAGE_BYTES:
+                return Response({'error': 'Image too large'}, status=413)
+            if not is_supported_image(image_bytes):
+                return Response({'error': 'Unsupported image type'}, status=415)
+
         # Get owner info
         owner_info = get_user_session_info(request)
 
-        transcriber = ImageTranscriber(client=client)
+        # Shared transcriber instance; it carries no per-request state
+        transcriber = get_image_transcriber()
 
         try:
             result = await transcriber.transcribe(
-                image_file=image_file,
+                image_file=memoryview(image_bytes) if image_bytes else None,
                 text_fallback=text_fallback,
                 enhance=enhance
             )
 
+            # Insert the row without the image so the response is not held
+            # up by the storage write; the image is attached by a background
+            # task once the id is known
             analysis_transcript = await AnalysisTranscript.objects.acreate(
                 user=owner_info['user'],
                 session_key=owner_info['session_key'],
-                image_obj=image_file,
                 text_obj=text_fallback,
                 is_question=is_question,
                 transcript=result
             )
 
+            if image_bytes:
+                schedule_image_attach(
+                    AnalysisTranscript, analysis_transcript.id, image_bytes, image_file.name
+                )
+
             request.session['analysis_transcript'] = analysis_transcript.id
 
             return Response(result, status=200)
         except ValueError as e:
             return Response({'error': str(e)}, status=400)
-        except Exception as e:
-            return Response({'error': str(e)}, status=500)
\ No newline at end of file
+        except asyncio.CancelledError:
+            # Client disconnects must keep cancelling cleanly, never be
+            # converted into an error response
+            raise
+        except (genai_errors.APIError, httpx.HTTPError) as e:
+            # Upstream Gemini failure: the request was fine, the
+            # dependency was not
+            return Response({'error': str(e)}, status=502)
\ No newline at end of file
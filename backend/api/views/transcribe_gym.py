@@ -2,11 +2,73 @@ from rest_framework.response import Response
 from adrf.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.conf import settings
-from ..services import ImageTranscriber, get_gemini_client
+from django.core.cache import cache
+from django.http import JsonResponse, StreamingHttpResponse
+import asyncio
+import hashlib
+import httpx
+import logging
+import orjson
+from google.genai import errors as genai_errors
+from ..services import get_image_transcriber
 from ..models import GymTranscript
 from .auth import get_user_session_info
+from .uploads import is_supported_image
+
+logger = logging.getLogger(__name__)
+
+# Strong references to in-flight insert tasks; asyncio only keeps weak
+# references, so an unawaited insert could otherwise be garbage collected
+_pending_inserts = set()
+
+
+def _insert_done(task):
+    """
+    Done callback for persistence tasks: drops the strong reference and
+    logs any failure, since nothing else awaits the task and a silently
+    swallowed exception would mean a silently lost transcript row.
+    """
+    _pending_inserts.discard(task)
+    if task.cancelled():
+        return
+    exc = task.exception()
+    if exc is not None:
+        logger.error('Gym transcript persistence failed', exc_info=exc)
+
+# Transcriptions are deterministic per (image, text, enhance) input, so
+# resubmitted worksheets can skip the Gemini round-trip for a day
+_TRANSCRIBE_CACHE_TTL = 86400
+
+
+async def _persist_transcript(owner_info, image_sha256, image_size,
+                              text_obj, transcript):
+    """
+    Upserts the transcript row. Image submissions are keyed per owner and
+    content hash so a resubmitted worksheet updates its existing row
+    instead of inserting a duplicate; text-only submissions always insert.
+    """
+    if image_sha256:
+        gym_transcript, _ = await GymTranscript.objects.aupdate_or_create(
+            user=owner_info['user'],
+            session_key=owner_info['session_key'],
+            image_sha256=image_sha256,
+            defaults={
+                'image_size': image_size,
+                'text_obj': text_obj,
+                'transcript': transcript,
+            }
+        )
+        return gym_transcript
+
+    return await GymTranscript.objects.acreate(
+        user=owner_info['user'],
+        session_key=owner_info['session_key'],
+        image_sha256='',
+        image_size=0,
+        text_obj=text_obj,
+        transcript=transcript
+    )
 
-FEYNMAN_GEMINI_API_KEY = settings.FEYNMAN_GEMINI_API_KEY
 
 class TranscribeGymImageView(APIView):
     parser_classes = (MultiPartParser, FormParser)
@@ -23,38 +85,163 @@ class TranscribeGymImageView(APIView):
             Returns:
                 Transcribed text in LaTeX/Markdown format, or error Response
             """
-            # Get shared client instance
-            client = get_gemini_client()
-            
-            # Get image and text from request
+            # Get image and text from request; the upload is read exactly
+            # once and the same buffer feeds both transcription and storage
             image_file = request.FILES.get('data_image')
+            image_bytes = image_file.read() if image_file is not None else None
             text_fallback = request.POST.get('data_text', '')
-            
+
+            # Reject oversized or non-image payloads from the header alone,
+            # before any PIL or Gemini resources are committed to them
+            if image_bytes:
+                if len(image_bytes) > settings.MAX_IMAGE_BYTES:
+                    return Response({'error': 'Image too large'}, status=413)
+                if not is_supported_image(image_bytes):
+                    return Response({'error': 'Unsupported image type'}, status=415)
+
             # Get owner info
             owner_info = get_user_session_info(request)
 
-            # Create transcriber instance
-            transcriber = ImageTranscriber(client=client)
+            # Shared transcriber instance; it carries no per-request state
+            transcriber = get_image_transcriber()
             
-            try:
-                result = await transcriber.transcribe(
-                    image_file=image_file,
-                    text_fallback=text_fallback,
-                    enhance=enhance
-                )
+            # Content-addressed cache key: refreshes and shared worksheets
+            # resubmit byte-identical images, and a hit skips Gemini entirely.
+            # The image-only digest is kept as the stored reference
+            image_sha256 = ''
+            cache_key = None
+            if image_bytes:
+                digest = hashlib.sha256(image_bytes)
+                image_sha256 = digest.hexdigest()
+                digest.update(text_fallback.encode('utf-8'))
+                cache_key = f'gym:tx:{digest.hexdigest()}:{int(enhance)}'
 
-                gym_transcript = await GymTranscript.objects.acreate(
-                    user=owner_info['info'],
-                    session_key=owner_info['session_key'],
-                    image_obj=image_file,
-                    text_obj=text_fallback,
-                    transcript = result
+            # Opt-in SSE path: first tokens reach the client as Gemini emits
+            # them instead of after the full generation
+            if request.query_params.get('stream') == '1' and image_bytes:
+                return self._stream_transcription(
+                    transcriber, image_bytes, text_fallback, enhance,
+                    owner_info, image_sha256, cache_key
                 )
 
-                request.session['gym_transcript'] = gym_transcript.id
+            try:
+                if not image_bytes:
+                    # Text-only submissions need no vision call at all;
+                    # the typed text is the transcript
+                    if not text_fallback:
+                        raise ValueError('You must input at least an image or text')
+                    result = text_fallback
+                else:
+                    result = await cache.aget(cache_key)
+                    if result is None:
+                        result = await transcriber.transcribe(
+                            image_file=memoryview(image_bytes),
+                            text_fallback=text_fallback,
+                            enhance=enhance
+                        )
+                        await cache.aset(cache_key, result, _TRANSCRIBE_CACHE_TTL)
+
+                # Schedule the upsert as a task the moment the transcript is
+                # known; the row stores only a hash reference to the image,
+                # so no media-storage write happens at all
+                insert_task = asyncio.create_task(_persist_transcript(
+                    owner_info,
+                    image_sha256,
+                    len(image_bytes) if image_bytes else 0,
+                    text_fallback,
+                    result
+                ))
+                _pending_inserts.add(insert_task)
+                insert_task.add_done_callback(_insert_done)
+
+                # Give the upsert a short window to land so the row id can
+                # ride along in the body; past that the response goes out
+                # with a null id rather than waiting on a slow write. The
+                # shield keeps the timeout from cancelling the write itself
+                gym_transcript = None
+                try:
+                    gym_transcript = await asyncio.wait_for(
+                        asyncio.shield(insert_task), timeout=0.05
+                    )
+                except asyncio.TimeoutError:
+                    pass
 
-                return Response(result, status=200)
+                # Plain JsonResponse skips DRF's renderer selection and
+                # content negotiation on the hot path; transcripts carry
+                # user work, so they are kept out of shared caches. The
+                # signed cookie replaces a per-upload session-store write
+                resp = JsonResponse({
+                    'transcript': result,
+                    'id': gym_transcript.id if gym_transcript else None,
+                })
+                resp['Cache-Control'] = 'no-store'
+                if gym_transcript is not None:
+                    resp.set_signed_cookie(
+                        'gym_transcript', str(gym_transcript.id),
+                        max_age=3600, httponly=True, samesite='Lax'
+                    )
+                return resp
             except ValueError as e:
                 return Response({'error': str(e)}, status=400)
+            except asyncio.CancelledError:
+                # Client disconnects must keep cancelling cleanly, never be
+                # converted into an error response
+                raise
+            except (genai_errors.APIError, httpx.HTTPError) as e:
+                # Upstream Gemini failure: the request was fine, the
+                # dependency was not
+                return Response({'error': str(e)}, status=502)
+
+    @staticmethod
+    def _stream_transcription(transcriber, image_bytes, text_fallback,
+                              enhance, owner_info, image_sha256, cache_key):
+        """
+        Builds the SSE response for ?stream=1 requests. The transcript row
+        is persisted by a background task once the stream completes; the
+        session is not touched because the response has already started by
+        then, so streaming clients correlate via their own state.
+        """
+        async def sse_stream():
+            pieces = []
+            try:
+                cached = await cache.aget(cache_key)
+                if cached is not None:
+                    pieces.append(cached)
+                    event = {'type': 'text', 'content': cached, 'is_complete': False}
+                    yield b"data: " + orjson.dumps(event) + b"\n\n"
+                else:
+                    async for text in transcriber.transcribe_stream(
+                        memoryview(image_bytes), enhance=enhance
+                    ):
+                        pieces.append(text)
+                        event = {'type': 'text', 'content': text, 'is_complete': False}
+                        yield b"data: " + orjson.dumps(event) + b"\n\n"
+
+                result = ''.join(pieces)
+                if cached is None:
+                    await cache.aset(cache_key, result, _TRANSCRIBE_CACHE_TTL)
+
+                insert_task = asyncio.create_task(_persist_transcript(
+                    owner_info,
+                    image_sha256,
+                    len(image_bytes),
+                    text_fallback,
+                    result
+                ))
+                _pending_inserts.add(insert_task)
+                insert_task.add_done_callback(_insert_done)
+
+                completion = {'type': 'complete', 'content': result, 'is_complete': True}
+                yield b"data: " + orjson.dumps(completion) + b"\n\n"
             except Exception as e:
-                return Response({'error': str(e)}, status=500)
\ No newline at end of file
+                error = {'type': 'error', 'content': str(e), 'is_complete': True}
+                yield b"data: " + orjson.dumps(error) + b"\n\n"
+
+        response = StreamingHttpResponse(
+            sse_stream(),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        response['Access-Control-Allow-Origin'] = '*'
+        return response
\ No newline at end of file
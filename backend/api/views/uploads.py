@@ -0,0 +1,72 @@
+"""Validation and background persistence helpers for uploaded transcript images"""
+import asyncio
+import logging
+from asgiref.sync import sync_to_async
+from django.core.files.base import ContentFile
+
+logger = logging.getLogger(__name__)
+
+# Strong references to in-flight saves; asyncio only keeps weak references
+# to tasks, so a pending save could otherwise be garbage collected mid-write
+_background_saves = set()
+
+
+def _save_done(task):
+    """
+    Done callback for attach tasks: drops the strong reference and logs
+    any failure, since nothing else awaits the task and a swallowed
+    exception would mean a silently dropped image.
+    """
+    _background_saves.discard(task)
+    if task.cancelled():
+        return
+    exc = task.exception()
+    if exc is not None:
+        logger.error('Background image attach failed', exc_info=exc)
+
+# Magic-byte prefixes of the image formats the transcriber accepts
+_IMAGE_MAGIC_PREFIXES = (
+    b'\xff\xd8\xff',        # JPEG
+    b'\x89PNG\r\n\x1a\n',   # PNG
+    b'GIF87a',              # GIF
+    b'GIF89a',
+)
+
+
+def is_supported_image(data) -> bool:
+    """
+    Cheap header sniff for the supported image formats, so malformed or
+    mislabeled uploads are rejected before any PIL decode is attempted.
+    """
+    head = bytes(data[:12])
+    if head.startswith(_IMAGE_MAGIC_PREFIXES):
+        return True
+    # WebP: RIFF container with a WEBP fourcc
+    return head[:4] == b'RIFF' and head[8:12] == b'WEBP'
+
+
+def schedule_image_attach(model, pk, image_bytes, name):
+    """
+    Attaches already-read upload bytes to an existing transcript row
+    without blocking the response.
+
+    The caller passes the bytes it read for transcription, so the upload
+    is never re-read from the request; the storage write itself runs in a
+    background task.
+    """
+    payload = ContentFile(image_bytes, name=name)
+
+    async def _attach():
+        def _save():
+            transcript = model.objects.get(pk=pk)
+            transcript.image_obj.save(payload.name, payload, save=True)
+
+        # thread_sensitive=False sends the write to the threadpool instead
+        # of the single shared sync thread, so concurrent image saves do not
+        # queue behind each other or behind request-path ORM work
+        await sync_to_async(_save, thread_sensitive=False)()
+
+    task = asyncio.create_task(_attach())
+    _background_saves.add(task)
+    task.add_done_callback(_save_done)
+    return task
@@ -51,6 +51,10 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Compresses the large LaTeX/Markdown response bodies; placed early so
+    # it wraps everything below it. The subclass skips streaming responses,
+    # which stock GZipMiddleware would compress frame by frame
+    'api.middleware.NonStreamingGZipMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -95,10 +99,51 @@ DATABASES = {
         'OPTIONS': {
             'connect_timeout': 10,
         },
+        # Keep connections open between requests to skip the Postgres
+        # connect/auth handshake on every request. Leave at 0 (close after
+        # each request) when running behind PgBouncer in transaction pooling
+        # mode, which handles the reuse itself.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '0')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
 
+# Cache Configuration
+# The chat view caches immutable analysis context here. Point REDIS_URL at a
+# Redis instance in production so entries are shared across workers; without
+# it the cache falls back to per-process local memory.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
+# File Upload Configuration
+# Spill multipart uploads above 1MiB to disk while parsing instead of
+# holding them fully in memory; handwriting photos are routinely larger
+FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024
+
+# Hard ceiling the transcribe endpoints enforce before decoding an image
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+
+# Handlers identical to Django's defaults except for a 1MiB read chunk,
+# cutting the number of body read/copy cycles on multi-MB image uploads
+FILE_UPLOAD_HANDLERS = [
+    'api.upload_handlers.LargeChunkMemoryFileUploadHandler',
+    'api.upload_handlers.LargeChunkTemporaryFileUploadHandler',
+]
+
 # Session Configuration
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'  # Database-backed sessions
 
@@ -125,7 +125,9 @@ class APIService {
       throw new Error(error.error || 'Transcription failed');
     }
 
-    return await response.text();
+    const payload = await response.json();
+    // Gym returns { transcript, id }; analysis returns the bare string
+    return typeof payload === 'string' ? payload : payload.transcript;
   }
 
   // Create analysis with SSE streaming